@@ -1,53 +1,293 @@
 import json
+import numpy as np
+import os
 import pandas as pd
 import random
+import re
+import tempfile
 
-from math import ceil, floor
+from functools import lru_cache
+from itertools import repeat
+from math import isfinite
 from pathlib import Path
-from typing import Union
+from typing import Any, Optional, Sequence, Union
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional, the batch kernel runs as plain Python
+    njit = None
+
+# Reusing one encoder and decoder skips the per-call setup in json.dumps and
+# json.loads
+_ENCODE = json.JSONEncoder(ensure_ascii=False).encode
+_DECODE = json.JSONDecoder().decode
+
+
+def _json_dumps(obj: object) -> bytes:
+    return _ENCODE(obj).encode("utf-8")
+
+
+def _json_loads(data: bytes) -> Any:
+    return _DECODE(data.decode("utf-8"))
+
+
+_LONG_NUMBER = re.compile(rb"\d{20}")
+
+
+def _has_non_finite(obj: object) -> bool:
+    """Whether obj holds a NaN or infinite float anywhere inside it"""
+    if isinstance(obj, float):
+        return not isfinite(obj)
+    if isinstance(obj, dict):
+        return any(map(_has_non_finite, obj.values()))
+    if isinstance(obj, (list, tuple)):
+        return any(map(_has_non_finite, obj))
+    return False
+
+
+try:
+    import orjson
+
+    def _dumps(obj: object) -> bytes:
+        # orjson writes NaN and infinity as null, stdlib json keeps them
+        if _has_non_finite(obj):
+            return _json_dumps(obj)
+        try:
+            return orjson.dumps(obj)
+        except orjson.JSONEncodeError:
+            # orjson only handles 64-bit integers, stdlib json has no limit
+            return _json_dumps(obj)
+
+    def _loads(data: bytes) -> Any:
+        # orjson reads integers beyond 64 bits as floats without raising, so
+        # lines holding numbers that long are left to stdlib json
+        if _LONG_NUMBER.search(data):
+            return _json_loads(data)
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # The NaN and Infinity tokens stdlib json writes are not valid
+            # JSON to orjson
+            return _json_loads(data)
+
+except ImportError:  # orjson is optional, the stdlib json module is the fallback
+    _dumps = _json_dumps
+    _loads = _json_loads
 
 TEST_RESULTS: dict[str, float] = {
     "easy": 23.8,
     "medium": 49.9,
     "hard": 105.1,
 }
+_RNG_CHOICE = random.Random().choice
 
 
 class Log:
-    """Class to generate and update the log"""
+    """Class to generate and update the log.
+
+    The log is stored as JSON-Lines: one ``{output: results}`` object per
+    line, so new entries can be appended without rewriting the file"""
 
-    def __init__(self, log_path: Path = Path("data/log.json")) -> None:
+    def __init__(
+        self, log_path: Path = Path("data/log.jsonl"), write_through: bool = True
+    ) -> None:
         self.log_path = log_path
-        if self.log_path.exists():
-            with open(self.log_path, "r", encoding="utf=8") as f:
-                self.log: dict[str, list[Union[int, str, float]]] = json.load(f)
-        else:
+        self.write_through = write_through
+        self._pending: list[bytes] = []
+        self._write_through_outside = write_through
+        self._depth = 0
+        self._needs_rewrite = False
+        self._log: Optional[dict[str, Sequence[Union[int, str, float]]]] = None
+
+    def __enter__(self) -> "Log":
+        """Defers writes until the outermost block exits, so they are flushed
+        together"""
+        if self._depth == 0:
+            self._write_through_outside = self.write_through
+            self.write_through = False
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self._depth -= 1
+        if self._depth == 0:
+            self.write_through = self._write_through_outside
+            self.flush()
+
+    @property
+    def log(self) -> dict[str, Sequence[Union[int, str, float]]]:
+        """The log entries, read from disk the first time they are needed"""
+        if self._log is None:
+            log: dict[str, Sequence[Union[int, str, float]]] = {}
+            # Opening directly costs one syscall whether or not the file
+            # exists, where checking exists() first would cost two
+            try:
+                with open(self.log_path, "rb", buffering=65536) as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        if line.endswith(b"\n"):
+                            log.update(_loads(line))
+                            continue
+                        # A final line without a newline may have been cut
+                        # short by a crash. Appending after it would corrupt
+                        # the next entry, so the next flush rewrites the file
+                        self._needs_rewrite = True
+                        try:
+                            log.update(_loads(line))
+                        except ValueError:
+                            pass
+            except FileNotFoundError:
+                pass
+            self._log = log
+        return self._log
+
+    @property
+    def dirty(self) -> bool:
+        """Whether there are entries which have not been written to disk yet"""
+        return bool(self._pending)
+
+    def write_log(self, output: int, results: Sequence[Union[int, str, float]]) -> None:
+        """Adds entry to the log if this result has not been seen before,
+        writing it straight to disk unless writes are being deferred"""
+        key = str(output)
+        log = self.log
+        size = len(log)
+        # The log only grows if setdefault inserted the entry
+        log.setdefault(key, results)
+        if len(log) > size:
+            try:
+                line = _dumps({key: results}) + b"\n"
+            except Exception:
+                # Leave no trace of an entry that can't be saved, so a later
+                # write of the same output tries again
+                del log[key]
+                raise
+            self._pending.append(line)
+            if self.write_through:
+                self.flush()
+
+    def flush(self) -> None:
+        """Appends any pending entries to the log file in a single write"""
+        if self._needs_rewrite:
+            self.compact()
+        elif self._pending:
             self.log_path.parent.mkdir(exist_ok=True, parents=True)
-            self.log = {}
+            with open(self.log_path, "ab", buffering=65536) as f:
+                f.write(b"".join(self._pending))
+            self._pending.clear()
+
+    def compact(self) -> None:
+        """Rewrites the log file with one line per entry. The entries go to a
+        temporary file which then replaces the log, so a crash part way
+        through leaves the previous log intact"""
+        self.log_path.parent.mkdir(exist_ok=True, parents=True)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=self.log_path.parent, prefix=".log.", suffix=".jsonl"
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(b"".join(_dumps({k: v}) + b"\n" for k, v in self.log.items()))
+                f.flush()
+                os.fsync(f.fileno())
+            # mkstemp creates the file as 0600, so give it the mode the log
+            # has. A missing log is created by open() first, so it takes the
+            # usual mode for the current umask
+            if not self.log_path.exists():
+                with open(self.log_path, "ab"):
+                    pass
+            os.chmod(tmp_path, self.log_path.stat().st_mode & 0o777)
+            os.replace(tmp_path, self.log_path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        self._pending.clear()
+        self._needs_rewrite = False
+
+    @classmethod
+    def invalidate(cls) -> None:
+        """Clears the cached log instances so the next access re-reads from disk"""
+        _get_log.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def _get_log(log_path: Path = Path("data/log.jsonl")) -> Log:
+    """Returns a shared Log for the given path, so the file is only parsed
+    once per process"""
+    return Log(log_path)
+
 
-    def write_log(self, output: int, results: list[Union[int, str, float]]) -> None:
-        """Writes entry to the log if this result has not been seen before"""
-        if str(output) not in self.log:
-            self.log[str(output)] = results
-            with open(self.log_path, "w", encoding="utf-8") as f:
-                json.dump(self.log, f, indent=4)
+@lru_cache(maxsize=128)
+def _parse_result_3(result_3: str) -> int:
+    """Extracts the integer from a result_3 string. Cached, as process_results
+    always passes the same value"""
+    return int(result_3.split("_", 2)[1])
+
+
+def _combine_results_known_r3(result_1: int, result_2: float, result_3: int) -> int:
+    """Sums the results once result_3 has already been parsed to an integer"""
+    # Rounds down below 51 and up from 51 with no conditional jumps: the floor
+    # is the truncated value less one for negative fractions, and the ceiling
+    # is the floor plus one whenever there is a fractional part
+    trunc_2 = int(result_2)
+    floor_2 = trunc_2 - (result_2 < trunc_2)
+    return result_1 + floor_2 + ((result_2 >= 51) & (result_2 != floor_2)) + result_3
 
 
 def combine_results(result_1: int, result_2: float, result_3: str) -> int:
     """Sums the integer values from three different result sets"""
     try:
-        new_result_2 = floor(result_2) if result_2 < 51 else ceil(result_2)
-        new_result_3 = int(result_3.split("_")[1])
-        return sum([result_1, new_result_2, new_result_3])
+        return _combine_results_known_r3(result_1, result_2, _parse_result_3(result_3))
     except Exception as exc:
         print(f"Unable to process the values: {result_1}, {result_2} and {result_3}")
         raise exc
 
 
+def _combine_batch(r1: np.ndarray, r2: np.ndarray, r3: np.ndarray) -> np.ndarray:
+    """Kernel for combine_results_batch, applying the combine_results rounding
+    to each row"""
+    out = np.empty(r1.size, np.int64)
+    for i in range(r1.size):
+        v = r2[i]
+        trunc_v = int(v)
+        floor_v = trunc_v - (v < trunc_v)
+        out[i] = r1[i] + floor_v + ((v >= 51) & (v != floor_v)) + r3[i]
+    return out
+
+
+if njit is not None:
+    _combine_batch = njit(cache=True)(_combine_batch)
+
+
+def combine_results_batch(
+    results_1: list[int], results_2: list[float], results_3: list[str]
+) -> np.ndarray:
+    """Combines many sets of results at once, returning an array of the same
+    values combine_results would give for each set. The kernel works in int64,
+    so every value, and every sum, must fit in that range"""
+    try:
+        r1 = np.asarray(results_1, dtype=np.int64)
+        # Strings are parsed here as numba cannot handle them inside the kernel
+        r3 = np.asarray([_parse_result_3(val) for val in results_3], dtype=np.int64)
+    except OverflowError as exc:
+        raise ValueError("Provided results must fit in a 64-bit integer") from exc
+    r2 = np.asarray(results_2, dtype=np.float64)
+    if not r1.size == r2.size == r3.size:
+        raise ValueError("Provided result sets must all be the same length")
+    # combine_results raises on non-finite values and handles any size of
+    # integer, but under numba these would be undefined. NaN fails this check
+    if not (np.abs(r2) < 2.0**63).all():
+        raise ValueError(
+            f"Provided results: {results_2} must all be finite and fit in a "
+            "64-bit integer"
+        )
+    return _combine_batch(r1, r2, r3)
+
+
 def randomise_result(length: int) -> int:
     """Randomly selects a number to be the index of the result range
     to use"""
-    return random.choice(range(length))
+    return _RNG_CHOICE(range(length))
 
 
 def collect_result_1(result_range: list[int]) -> int:
@@ -65,20 +305,22 @@ def collect_result_2(test_type: str) -> float:
 
 def validate_result_range(result_range: list[int]) -> None:
     """Validates that the result range for result_1 are all integers"""
-    if not all(isinstance(val, int) for val in result_range):
+    # map runs the isinstance checks in C, without a generator frame per item
+    if not all(map(isinstance, result_range, repeat(int))):
         raise ValueError(f"Provided results: {result_range} must contain only integers")
 
 
 def validate_test_type(test_type: str) -> None:
     """Validates that the test type is valid"""
-    if not test_type in TEST_RESULTS:
+    if test_type not in TEST_RESULTS:
         raise ValueError(f"Provided test_type: {test_type} is not a valid test type")
 
 
 def process_results(
-    input_result_range: list[int], input_test_type: str
+    input_result_range: list[int], input_test_type: str, log: bool = True
 ) -> pd.DataFrame:
-    """Print out the sum of the results"""
+    """Print out the sum of the results, recording them in the log unless
+    log is False"""
     validate_result_range(input_result_range)
     validate_test_type(input_test_type)
 
@@ -87,8 +329,8 @@ def process_results(
     result_3 = "number_3"
     output = combine_results(result_1, result_2, result_3)
 
-    log = Log()
-    log.write_log(output, [result_1, result_2, result_3])
+    if log:
+        _get_log().write_log(output, (result_1, result_2, result_3))
 
     return pd.DataFrame(
         data={
@@ -100,8 +342,9 @@ def process_results(
     )
 
 
-print(
-    process_results(
-        input_result_range=[1, 1, 5, 12, 13, 14, 55], input_test_type="medium"
+if __name__ == "__main__":
+    print(
+        process_results(
+            input_result_range=[1, 1, 5, 12, 13, 14, 55], input_test_type="medium"
+        )
     )
-)
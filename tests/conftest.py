@@ -13,5 +13,5 @@
 #     """Function called by pytest automatically once all tests are run to
 #     clean up test artifacts"""
 
-#     if Path("data/test_log.json").is_file():
-#         Path("data/test_log.json").unlink()
+#     if Path("data/test_log.jsonl").is_file():
+#         Path("data/test_log.jsonl").unlink()